@@ -1,11 +1,11 @@
-use std::path::Path;
+use std::path::{Path, PathBuf};
 
 use anyhow::{anyhow, Context, Result};
 use figment::{
     providers::{Env, Format, Toml},
     Figment,
 };
-use regex::Regex;
+use regex::{Regex, RegexSet};
 use serde::Deserialize;
 
 #[derive(Debug, Deserialize)]
@@ -26,6 +26,10 @@ pub struct BotConfig {
 pub struct GcpConfig {
     pub bucket: String,
     pub sheet_id: String,
+    /// Service-account key files that Sheets writes rotate across. Empty means
+    /// the runtime's own ADC identity.
+    #[serde(default)]
+    pub sheets_key_files: Vec<PathBuf>,
 }
 
 #[derive(Debug, Deserialize)]
@@ -54,6 +58,9 @@ pub struct Config {
     pub bot: BotConfig,
     pub gcp: GcpConfig,
     pub tournaments: Vec<Tournament>,
+    /// Every tournament's `channel_pattern`, for a single-pass "could any
+    /// tournament claim this channel" check.
+    pub channel_patterns: RegexSet,
 }
 
 impl Config {
@@ -138,10 +145,14 @@ fn validate(raw: RawConfig) -> Result<Config> {
         ));
     }
 
+    let channel_patterns = RegexSet::new(tournaments.iter().map(|t| t.channel_pattern.as_str()))
+        .context("building combined channel_pattern set")?;
+
     Ok(Config {
         bot: raw.bot,
         gcp: raw.gcp,
         tournaments,
+        channel_patterns,
     })
 }
 
@@ -215,6 +226,7 @@ channel_pattern = ".*"
         );
         let cfg = validate(raw).unwrap();
         assert_eq!(cfg.bot.admin_user_ids, vec![1, 2]);
+        assert!(cfg.gcp.sheets_key_files.is_empty());
         assert_eq!(cfg.tournaments.len(), 2);
         assert_eq!(cfg.tournaments[0].sheet_tab, "SF 2026");
         assert_eq!(cfg.tournaments[0].gcs_prefix, "sf-2026/");
@@ -222,6 +234,50 @@ channel_pattern = ".*"
         assert!(cfg.tournaments[1].catch_all);
     }
 
+    #[test]
+    fn channel_patterns_cover_every_tournament() {
+        let raw = raw_from_toml(
+            r#"
+[bot]
+discord_token = "t"
+admin_user_ids = [1]
+[gcp]
+bucket = "b"
+sheet_id = "s"
+[[tournaments]]
+name = "SF"
+channel_pattern = "^sf-.*-results$"
+[[tournaments]]
+name = "TG"
+channel_pattern = "^tg-.*-results$"
+"#,
+        );
+        let cfg = validate(raw).unwrap();
+        assert!(cfg.channel_patterns.is_match("sf-final-results"));
+        assert!(cfg.channel_patterns.is_match("tg-r1-results"));
+        assert!(!cfg.channel_patterns.is_match("general"));
+    }
+
+    #[test]
+    fn loads_sheets_key_files() {
+        let raw = raw_from_toml(
+            r#"
+[bot]
+discord_token = "t"
+admin_user_ids = [1]
+[gcp]
+bucket = "b"
+sheet_id = "s"
+sheets_key_files = ["/keys/a.json", "/keys/b.json"]
+"#,
+        );
+        let cfg = validate(raw).unwrap();
+        assert_eq!(
+            cfg.gcp.sheets_key_files,
+            vec![PathBuf::from("/keys/a.json"), PathBuf::from("/keys/b.json")]
+        );
+    }
+
     #[test]
     fn rejects_empty_admin_user_ids() {
         let raw = raw_from_toml(
@@ -29,22 +29,27 @@ impl ResultsEntry {
         }
     }
 
-    pub fn get_row(&self) -> Vec<String> {
-        vec![
-            self.message_link.clone(),
-            self.poster.clone(),
-            optstr(self.bracket.as_deref()),
+    /// Consumes the entry into the full sheet row, `timestamp` first, so the
+    /// owned strings move into the row instead of being cloned.
+    pub fn into_row(self, timestamp: String) -> Vec<String> {
+        let row = vec![
+            timestamp,
+            self.message_link,
+            self.poster,
+            self.bracket.unwrap_or_default(),
             optstr(self.player1_id),
-            optstr(self.player1_name.as_deref()),
+            self.player1_name.unwrap_or_default(),
             optstr(self.player1_score),
             optstr(self.player2_id),
-            optstr(self.player2_name.as_deref()),
+            self.player2_name.unwrap_or_default(),
             optstr(self.player2_score),
-            optstr(self.map_draft.as_deref()),
-            optstr(self.civ_draft.as_deref()),
-            optstr(self.replays_link.as_deref()),
-            self.message_contents.clone(),
-        ]
+            self.map_draft.unwrap_or_default(),
+            self.civ_draft.unwrap_or_default(),
+            self.replays_link.unwrap_or_default(),
+            self.message_contents,
+        ];
+        debug_assert_eq!(row.len(), SHEET_COLUMN_COUNT);
+        row
     }
 }
 
@@ -57,30 +62,31 @@ mod tests {
     use super::*;
 
     #[test]
-    fn get_row_all_none_returns_empty_optional_columns() {
+    fn into_row_all_none_returns_empty_optional_columns() {
         let entry = ResultsEntry::new("link".into(), "poster".into(), "body".into());
-        let row = entry.get_row();
-        assert_eq!(row.len(), SHEET_COLUMN_COUNT - 1);
-        assert_eq!(row[0], "link");
-        assert_eq!(row[1], "poster");
-        for cell in &row[2..12] {
+        let row = entry.into_row("ts".into());
+        assert_eq!(row.len(), SHEET_COLUMN_COUNT);
+        assert_eq!(row[0], "ts");
+        assert_eq!(row[1], "link");
+        assert_eq!(row[2], "poster");
+        for cell in &row[3..13] {
             assert_eq!(cell, "");
         }
-        assert_eq!(row[12], "body");
+        assert_eq!(row[13], "body");
     }
 
     #[test]
-    fn get_row_score_zero_renders_as_zero_not_blank() {
+    fn into_row_score_zero_renders_as_zero_not_blank() {
         let mut entry = ResultsEntry::new("".into(), "".into(), "".into());
         entry.player1_score = Some(0);
         entry.player2_score = Some(3);
-        let row = entry.get_row();
-        assert_eq!(row[5], "0");
-        assert_eq!(row[8], "3");
+        let row = entry.into_row("".into());
+        assert_eq!(row[6], "0");
+        assert_eq!(row[9], "3");
     }
 
     #[test]
-    fn get_row_fully_populated() {
+    fn into_row_fully_populated() {
         let entry = ResultsEntry {
             message_link: "https://discord.com/m/1".into(),
             poster: "Alice".into(),
@@ -97,8 +103,9 @@ mod tests {
             replays_link: Some("gcs://b/x".into()),
         };
         assert_eq!(
-            entry.get_row(),
+            entry.into_row("2026-01-01T00:00:00+00:00".into()),
             vec![
+                "2026-01-01T00:00:00+00:00",
                 "https://discord.com/m/1",
                 "Alice",
                 "Recruit SF",
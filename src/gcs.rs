@@ -1,5 +1,6 @@
 use anyhow::{Context, Result};
 use backon::Retryable;
+use bytes::Bytes;
 use gcloud_storage::{
     client::{Client, ClientConfig},
     http::objects::upload::{Media, UploadObjectRequest, UploadType},
@@ -11,6 +12,8 @@ use crate::retry;
 pub struct GcsClient {
     client: Client,
     bucket: String,
+    /// `gcs://<bucket>/`, built once for [`GcsClient::link`].
+    link_prefix: String,
 }
 
 impl GcsClient {
@@ -20,14 +23,20 @@ impl GcsClient {
             .await
             .context("building GCS ADC client (set GOOGLE_APPLICATION_CREDENTIALS, or run on a GCE VM with an attached service account)")?;
         let client = Client::new(config);
-        Ok(Self { client, bucket })
+        let link_prefix = format!("gcs://{bucket}/");
+        Ok(Self {
+            client,
+            bucket,
+            link_prefix,
+        })
     }
 
-    pub fn bucket(&self) -> &str {
-        &self.bucket
+    /// The `gcs://` link recorded in the sheet's replays column.
+    pub fn link(&self, object_name: &str) -> String {
+        [self.link_prefix.as_str(), object_name].concat()
     }
 
-    pub async fn upload(&self, object_name: &str, bytes: Vec<u8>) -> Result<()> {
+    pub async fn upload(&self, object_name: &str, bytes: Bytes) -> Result<()> {
         let upload_type = UploadType::Simple(Media::new(object_name.to_string()));
         let req = UploadObjectRequest {
             bucket: self.bucket.clone(),
@@ -35,7 +44,7 @@ impl GcsClient {
         };
         let byte_count = bytes.len();
         // `upload_object` consumes the body, so each retry attempt gets its own
-        // clone. Replays are small and this only re-clones on an actual retry.
+        // clone — a refcount bump on `Bytes`, not a copy of the payload.
         (|| async {
             self.client
                 .upload_object(&req, bytes.clone(), &upload_type)
@@ -1,11 +1,16 @@
-use std::sync::Arc;
+use std::{
+    collections::{HashSet, VecDeque},
+    hash::Hash,
+    sync::{Arc, Mutex},
+};
 
 use anyhow::{Context as _, Result};
 use chrono::{SecondsFormat, Utc};
+use futures::{stream, StreamExt, TryStreamExt};
 use serenity::{
     all::{
-        Channel, ChannelType, Context, EventHandler, GuildChannel, Message, MessageUpdateEvent,
-        Ready, UserId,
+        Attachment, Channel, ChannelType, Context, EventHandler, GuildChannel, Message, MessageId,
+        MessageUpdateEvent, Ready, Timestamp, UserId,
     },
     async_trait,
 };
@@ -16,14 +21,64 @@ use crate::{
     entry::ResultsEntry,
     gcs::GcsClient,
     parse::parse_message_content,
-    sheets::SheetsClient,
+    sheets::RowQueue,
     tournament::{match_tournament, MatchInput},
 };
 
+/// Cap on attachments downloaded and uploaded at once for a single message.
+const MAX_CONCURRENT_UPLOADS: usize = 8;
+
+/// How many recently processed (message, edit) pairs to remember for
+/// redelivery dedupe.
+const SEEN_CAPACITY: usize = 10_000;
+
 pub struct Handler {
-    pub config: Arc<Config>,
-    pub sheets: Arc<SheetsClient>,
-    pub gcs: Arc<GcsClient>,
+    config: Arc<Config>,
+    rows: RowQueue,
+    gcs: Arc<GcsClient>,
+    seen: RecentKeys<(MessageId, Option<Timestamp>)>,
+}
+
+impl Handler {
+    pub fn new(config: Arc<Config>, rows: RowQueue, gcs: Arc<GcsClient>) -> Self {
+        Self {
+            config,
+            rows,
+            gcs,
+            seen: RecentKeys::new(SEEN_CAPACITY),
+        }
+    }
+}
+
+/// A bounded set that forgets its oldest key once full.
+struct RecentKeys<K> {
+    inner: Mutex<(HashSet<K>, VecDeque<K>)>,
+    capacity: usize,
+}
+
+impl<K: Eq + Hash + Clone> RecentKeys<K> {
+    fn new(capacity: usize) -> Self {
+        Self {
+            inner: Mutex::new((HashSet::new(), VecDeque::new())),
+            capacity,
+        }
+    }
+
+    /// Records `key`; returns `false` if it was already present.
+    fn insert(&self, key: K) -> bool {
+        let mut guard = self.inner.lock().unwrap_or_else(|e| e.into_inner());
+        let (set, order) = &mut *guard;
+        if !set.insert(key.clone()) {
+            return false;
+        }
+        order.push_back(key);
+        if order.len() > self.capacity {
+            if let Some(oldest) = order.pop_front() {
+                set.remove(&oldest);
+            }
+        }
+        true
+    }
 }
 
 /// Which gateway event delivered the message. On [`MessageEvent::Updated`],
@@ -69,7 +124,19 @@ impl EventHandler for Handler {
             debug!(id = %event.id, "skipping non-edit update (no edited_timestamp)");
             return;
         }
-        let message = match new {
+        // Bail out before the REST fetch below for edits that could never
+        // produce a row: DMs and the bot's own messages.
+        let Some(guild_id) = event.guild_id else {
+            return;
+        };
+        if event
+            .author
+            .as_ref()
+            .is_some_and(|a| a.id == ctx.cache.current_user().id)
+        {
+            return;
+        }
+        let mut message = match new {
             Some(m) => m,
             None => match ctx.http.get_message(event.channel_id, event.id).await {
                 Ok(m) => m,
@@ -79,6 +146,9 @@ impl EventHandler for Handler {
                 }
             },
         };
+        // Messages fetched over REST carry no guild_id; restore it from the
+        // gateway event so process_message doesn't mistake them for DMs.
+        message.guild_id.get_or_insert(guild_id);
         if let Err(e) = self
             .process_message(&ctx, message, MessageEvent::Updated)
             .await
@@ -98,11 +168,21 @@ impl Handler {
         if message.author.id == ctx.cache.current_user().id {
             return Ok(());
         }
+        // DMs and group DMs can never be results channels.
+        if message.guild_id.is_none() {
+            return Ok(());
+        }
 
-        let (channel, category) = match resolve_channel(ctx, &message).await? {
+        let channel = match resolve_channel(ctx, &message).await? {
             Some(c) => c,
             None => return Ok(()),
         };
+        // One pass over the name against every tournament's pattern rejects
+        // unrelated channels before the category lookup and full matching.
+        if !self.config.channel_patterns.is_match(&channel.name) {
+            return Ok(());
+        }
+        let category = resolve_category(ctx, &channel).await;
 
         let input = MatchInput {
             guild_id: channel.guild_id.get(),
@@ -114,6 +194,13 @@ impl Handler {
             None => return Ok(()),
         };
 
+        // Gateway resumes can redeliver a create or edit event; only the first
+        // delivery of each (message, edit) pair gets a row.
+        if !self.seen.insert((message.id, message.edited_timestamp)) {
+            debug!(id = %message.id, "skipping already-processed message event");
+            return Ok(());
+        }
+
         info!(
             id = %message.id,
             tournament = %tournament.name,
@@ -135,12 +222,12 @@ impl Handler {
             .await?;
 
         let now = Utc::now();
-        let mut row = Vec::with_capacity(crate::entry::SHEET_COLUMN_COUNT);
-        row.push(now.to_rfc3339_opts(SecondsFormat::Secs, false));
-        row.extend(entry.get_row());
+        let row = entry.into_row(now.to_rfc3339_opts(SecondsFormat::Secs, false));
 
-        if let Err(e) = self.sheets.append_row(&tournament.sheet_tab, row).await {
-            error!("appending row failed for message {}: {e:#}", message.id);
+        // The write itself happens on the batching flusher, which reports its
+        // own failures.
+        if let Err(e) = self.rows.push(&tournament.sheet_tab, message.id.get(), row) {
+            error!("queueing row failed for message {}: {e:#}", message.id);
         }
 
         Ok(())
@@ -167,48 +254,18 @@ impl Handler {
 
         parse_message_content(&mut entry, &message.content);
 
-        if let Some(id) = entry.player1_id {
-            entry.player1_name = Some(fetch_display_name(ctx, UserId::new(id)).await);
-        }
-        if let Some(id) = entry.player2_id {
-            entry.player2_name = Some(fetch_display_name(ctx, UserId::new(id)).await);
-        }
+        (entry.player1_name, entry.player2_name) = tokio::join!(
+            player_display_name(ctx, message, entry.player1_id),
+            player_display_name(ctx, message, entry.player2_id),
+        );
 
-        let mut download_links = Vec::with_capacity(message.attachments.len());
-        for (idx, attachment) in message.attachments.iter().enumerate() {
-            let object_name = format!(
-                "{}{}_{}",
-                tournament.gcs_prefix, attachment.id, attachment.filename
-            );
-            // Discord does not allow adding or changing attachments on an
-            // existing message, so on an edit the files were already uploaded
-            // by the original `message` event. Re-uploading would overwrite the
-            // existing object, which GCS treats as a delete+create and rejects
-            // for a create-only service account. Reuse the deterministic name
-            // so the row still carries a complete replays_link.
-            if event == MessageEvent::Updated {
-                debug!(
-                    "Skipping upload of attachment {} on message edit; reusing {}",
-                    idx + 1,
-                    object_name
-                );
-            } else {
-                let bytes = attachment.download().await.with_context(|| {
-                    format!(
-                        "downloading attachment {} ({})",
-                        attachment.id, attachment.filename
-                    )
-                })?;
-                info!(
-                    "Uploading attachment {} as {} with {} bytes of data",
-                    idx + 1,
-                    object_name,
-                    bytes.len()
-                );
-                self.gcs.upload(&object_name, bytes).await?;
-            }
-            download_links.push(format!("gcs://{}/{}", self.gcs.bucket(), object_name));
-        }
+        // Attachments are independent, so download+upload them concurrently;
+        // `buffered` keeps the links in attachment order.
+        let download_links: Vec<String> = stream::iter(message.attachments.iter().enumerate())
+            .map(|(idx, attachment)| self.store_attachment(idx, attachment, tournament, event))
+            .buffered(MAX_CONCURRENT_UPLOADS)
+            .try_collect()
+            .await?;
 
         if !download_links.is_empty() {
             entry.replays_link = Some(download_links.join("\n"));
@@ -218,39 +275,96 @@ impl Handler {
         let _ = channel;
         Ok(entry)
     }
+
+    /// Uploads one attachment to GCS (on a new message) and returns its
+    /// `gcs://` link for the replays column.
+    async fn store_attachment(
+        &self,
+        idx: usize,
+        attachment: &Attachment,
+        tournament: &Tournament,
+        event: MessageEvent,
+    ) -> Result<String> {
+        let object_name = format!(
+            "{}{}_{}",
+            tournament.gcs_prefix, attachment.id, attachment.filename
+        );
+        // Discord does not allow adding or changing attachments on an
+        // existing message, so on an edit the files were already uploaded
+        // by the original `message` event. Re-uploading would overwrite the
+        // existing object, which GCS treats as a delete+create and rejects
+        // for a create-only service account. Reuse the deterministic name
+        // so the row still carries a complete replays_link.
+        if event == MessageEvent::Updated {
+            debug!(
+                "Skipping upload of attachment {} on message edit; reusing {}",
+                idx + 1,
+                object_name
+            );
+        } else {
+            let bytes = attachment.download().await.with_context(|| {
+                format!(
+                    "downloading attachment {} ({})",
+                    attachment.id, attachment.filename
+                )
+            })?;
+            debug!(
+                "Uploading attachment {} as {} with {} bytes of data",
+                idx + 1,
+                object_name,
+                bytes.len()
+            );
+            self.gcs.upload(&object_name, bytes.into()).await?;
+        }
+        Ok(self.gcs.link(&object_name))
+    }
 }
 
-async fn resolve_channel(
-    ctx: &Context,
-    message: &Message,
-) -> Result<Option<(GuildChannel, Option<String>)>> {
+/// Channel and category lookups go through `ctx` so they are served from the
+/// serenity cache (populated via the `GUILDS` intent) and only fall back to
+/// REST on a miss — this runs for every message in every channel the bot can
+/// see.
+async fn resolve_channel(ctx: &Context, message: &Message) -> Result<Option<GuildChannel>> {
     let channel = message
         .channel_id
-        .to_channel(&ctx.http)
+        .to_channel(ctx)
         .await
         .with_context(|| format!("fetching channel {}", message.channel_id))?;
-    let guild_channel = match channel {
-        Channel::Guild(g) if g.kind == ChannelType::Text => g,
-        _ => return Ok(None),
-    };
-
-    let category = match guild_channel.parent_id {
-        Some(parent_id) => match parent_id.to_channel(&ctx.http).await {
-            Ok(Channel::Guild(parent)) if parent.kind == ChannelType::Category => Some(parent.name),
-            Ok(_) => None,
-            Err(e) => {
-                warn!("failed to fetch parent category {parent_id}: {e}");
-                None
-            }
-        },
-        None => None,
-    };
+    match channel {
+        Channel::Guild(g) if g.kind == ChannelType::Text => Ok(Some(g)),
+        _ => Ok(None),
+    }
+}
 
-    Ok(Some((guild_channel, category)))
+async fn resolve_category(ctx: &Context, channel: &GuildChannel) -> Option<String> {
+    let parent_id = channel.parent_id?;
+    match parent_id.to_channel(ctx).await {
+        Ok(Channel::Guild(parent)) if parent.kind == ChannelType::Category => Some(parent.name),
+        Ok(_) => None,
+        Err(e) => {
+            warn!("failed to fetch parent category {parent_id}: {e}");
+            None
+        }
+    }
+}
+
+/// Discord sends the mentioned users along with the message, so a player's name
+/// is normally already in `message.mentions`; only a miss goes to the cache and
+/// then REST.
+async fn player_display_name(ctx: &Context, message: &Message, id: Option<u64>) -> Option<String> {
+    let user_id = UserId::new(id?);
+    if let Some(user) = message.mentions.iter().find(|u| u.id == user_id) {
+        return Some(
+            user.global_name
+                .clone()
+                .unwrap_or_else(|| user.name.clone()),
+        );
+    }
+    Some(fetch_display_name(ctx, user_id).await)
 }
 
 async fn fetch_display_name(ctx: &Context, user_id: UserId) -> String {
-    match user_id.to_user(&ctx.http).await {
+    match user_id.to_user(ctx).await {
         Ok(user) => user.global_name.unwrap_or(user.name),
         Err(e) => {
             warn!("failed to fetch user {user_id}: {e}");
@@ -258,3 +372,20 @@ async fn fetch_display_name(ctx: &Context, user_id: UserId) -> String {
         }
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn recent_keys_rejects_repeat_until_evicted() {
+        let seen = RecentKeys::new(2);
+        assert!(seen.insert(1));
+        assert!(!seen.insert(1));
+        assert!(seen.insert(2));
+        assert!(seen.insert(3));
+        // 1 was the oldest and fell out once 3 arrived.
+        assert!(seen.insert(1));
+        assert!(!seen.insert(3));
+    }
+}
@@ -1,7 +1,11 @@
-use std::{path::PathBuf, sync::Arc};
+use std::{io::IsTerminal, path::PathBuf, sync::Arc, time::Duration};
 
 use anyhow::{Context, Result};
 use serenity::{all::GatewayIntents, http::Http, Client};
+use tokio::{
+    signal::unix::{signal, SignalKind},
+    time::{timeout, Instant},
+};
 use tracing::{info, warn, Level};
 use tracing_subscriber::{fmt, prelude::*, registry, reload, EnvFilter};
 
@@ -16,10 +20,20 @@ mod sheets;
 mod tournament;
 
 use crate::{
-    config::Config, gcs::GcsClient, handler::Handler, notify::DiscordErrorLayer,
-    sheets::SheetsClient,
+    config::Config,
+    gcs::GcsClient,
+    handler::Handler,
+    notify::DiscordErrorLayer,
+    sheets::{RowQueue, SheetsClient},
 };
 
+/// How long shutdown may take in total, counted from SIGTERM. Cloud Run
+/// sends SIGKILL 10 s after SIGTERM.
+const SHUTDOWN_GRACE: Duration = Duration::from_secs(8);
+/// Cap on the gateway disconnect within [`SHUTDOWN_GRACE`] (serenity waits
+/// up to 5 s per shard); the rest is left for writing queued sheet rows.
+const SHARD_SHUTDOWN_GRACE: Duration = Duration::from_secs(3);
+
 #[tokio::main]
 async fn main() -> Result<()> {
     // rustls 0.23 has both `ring` and `aws-lc-rs` compiled in (pulled by
@@ -34,7 +48,9 @@ async fn main() -> Result<()> {
     let (discord_layer, discord_handle) = reload::Layer::new(None::<DiscordErrorLayer>);
     registry()
         .with(EnvFilter::try_from_default_env().unwrap_or_else(|_| EnvFilter::new("info")))
-        .with(fmt::layer())
+        // No ANSI colour codes unless a human is watching: in Cloud Run they
+        // are just noise in every log line.
+        .with(fmt::layer().with_ansi(std::io::stdout().is_terminal()))
         .with(discord_layer)
         .init();
 
@@ -68,7 +84,7 @@ async fn main() -> Result<()> {
     );
 
     let sheets = Arc::new(
-        SheetsClient::new(config.gcp.sheet_id.clone())
+        SheetsClient::new(config.gcp.sheet_id.clone(), &config.gcp.sheets_key_files)
             .await
             .context("constructing Sheets client")?,
     );
@@ -81,6 +97,10 @@ async fn main() -> Result<()> {
         .ensure_tabs(&configured_tabs)
         .await
         .context("ensuring tournament tabs exist")?;
+    sheets
+        .verify_write_identities()
+        .await
+        .context("checking Sheets write identities")?;
     info!(
         "Results sheet set up; {} tournament tab(s) verified",
         configured_tabs.len()
@@ -92,20 +112,52 @@ async fn main() -> Result<()> {
             .context("constructing GCS client")?,
     );
 
+    let (rows, row_flusher) = RowQueue::spawn(sheets);
+
     let token = config.bot.discord_token.clone();
-    let intents = GatewayIntents::GUILD_MESSAGES | GatewayIntents::MESSAGE_CONTENT;
-    let handler = Handler {
-        config: config.clone(),
-        sheets,
-        gcs,
-    };
+    // `GUILDS` keeps guild channels in the cache so per-message channel and
+    // category lookups don't hit REST. The privileged `GUILD_MEMBERS` intent
+    // (needed to pre-chunk member lists into the cache) is deliberately not
+    // requested: player names already arrive in each message's `mentions`.
+    let intents =
+        GatewayIntents::GUILDS | GatewayIntents::GUILD_MESSAGES | GatewayIntents::MESSAGE_CONTENT;
+    let handler = Handler::new(config.clone(), rows, gcs);
     let mut client = Client::builder(token, intents)
         .event_handler(handler)
         .await
         .context("building Discord client")?;
 
+    // Cloud Run stops the container (every deploy / revision roll) with
+    // SIGTERM, which serenity doesn't handle: stop the client ourselves and
+    // spend what is left of the grace window writing queued rows.
+    let mut sigterm = signal(SignalKind::terminate()).context("installing SIGTERM handler")?;
+
     info!("Connecting to Discord...");
-    if let Err(e) = client.start().await {
+    let result = tokio::select! {
+        result = client.start() => Some(result),
+        _ = sigterm.recv() => {
+            info!("Received SIGTERM");
+            None
+        }
+        _ = tokio::signal::ctrl_c() => {
+            info!("Received Ctrl-C");
+            None
+        }
+    };
+    let deadline = Instant::now() + SHUTDOWN_GRACE;
+    if result.is_none()
+        && timeout(SHARD_SHUTDOWN_GRACE, client.shard_manager.shutdown_all())
+            .await
+            .is_err()
+    {
+        warn!("Discord shards did not disconnect within {SHARD_SHUTDOWN_GRACE:?}");
+    }
+
+    // Handlers still running keep the row queue open until they finish.
+    drop(client);
+    row_flusher.shutdown(deadline).await;
+
+    if let Some(Err(e)) = result {
         warn!("Discord client exited with error: {e:#}");
         return Err(e.into());
     }
@@ -5,19 +5,45 @@ use tracing::info;
 
 use crate::entry::ResultsEntry;
 
-static DISCORD_TAG: LazyLock<Regex> = LazyLock::new(|| Regex::new(r"<@(\d+)>").unwrap());
-static MAP_DRAFT: LazyLock<Regex> =
-    LazyLock::new(|| Regex::new(r"(?i)maps?(?:\s+draft)?\s*:?\s*([^\s]+)").unwrap());
-static CIV_DRAFT: LazyLock<Regex> =
-    LazyLock::new(|| Regex::new(r"(?i)civs?(?:\s+draft)?\s*:?\s*([^\s]+)").unwrap());
+/// Mentions and map/civ draft links as one alternation, so a single pass both
+/// extracts them and marks the spans the score line must not see.
+static TOKENS: LazyLock<Regex> = LazyLock::new(|| {
+    Regex::new(
+        r"(?x)
+        <@(?P<tag>\d+)>
+        | (?i:maps?(?:\s+draft)?\s*:?\s*(?P<map>[^\s]+))
+        | (?i:civs?(?:\s+draft)?\s*:?\s*(?P<civ>[^\s]+))
+        ",
+    )
+    .unwrap()
+});
 static SCORE_LINE: LazyLock<Regex> =
     LazyLock::new(|| Regex::new(r"(?m)^[^\d]*(\d{1,4})[^\d\v]+(\d{1,4})[^\d]*$").unwrap());
 
 pub fn parse_message_content(entry: &mut ResultsEntry, content: &str) {
-    let player_ids: Vec<u64> = DISCORD_TAG
-        .captures_iter(content)
-        .filter_map(|c| c.get(1)?.as_str().parse().ok())
-        .collect();
+    let mut player_ids: Vec<u64> = Vec::new();
+    let mut map_draft = None;
+    let mut civ_draft = None;
+    // `content` with every token span cut out; digits in mentions and draft
+    // URLs must not be mistaken for a score.
+    let mut remainder = String::with_capacity(content.len());
+    let mut last = 0;
+    for caps in TOKENS.captures_iter(content) {
+        let span = caps.get(0).unwrap();
+        remainder.push_str(&content[last..span.start()]);
+        last = span.end();
+        if let Some(tag) = caps.name("tag") {
+            if let Ok(id) = tag.as_str().parse() {
+                player_ids.push(id);
+            }
+        } else if let Some(map) = caps.name("map") {
+            map_draft.get_or_insert(map.as_str());
+        } else if let Some(civ) = caps.name("civ") {
+            civ_draft.get_or_insert(civ.as_str());
+        }
+    }
+    remainder.push_str(&content[last..]);
+
     if player_ids.len() == 2 {
         entry.player1_id = Some(player_ids[0]);
         entry.player2_id = Some(player_ids[1]);
@@ -27,20 +53,19 @@ pub fn parse_message_content(entry: &mut ResultsEntry, content: &str) {
             player_ids.len()
         );
     }
-
-    let content = DISCORD_TAG.replace_all(content, "");
-
-    if let Some(c) = MAP_DRAFT.captures(&content) {
-        entry.map_draft = Some(c.get(1).unwrap().as_str().to_string());
+    if let Some(map) = map_draft {
+        entry.map_draft = Some(map.to_string());
     }
-    let content = MAP_DRAFT.replace_all(&content, "");
-
-    if let Some(c) = CIV_DRAFT.captures(&content) {
-        entry.civ_draft = Some(c.get(1).unwrap().as_str().to_string());
+    if let Some(civ) = civ_draft {
+        entry.civ_draft = Some(civ.to_string());
     }
-    let content = CIV_DRAFT.replace_all(&content, "");
 
-    if let Some(c) = SCORE_LINE.captures(&content) {
+    // A score only parses from ASCII digits, so skip the scan when none survive
+    // (typical for a post that is just mentions and draft links).
+    if !remainder.bytes().any(|b| b.is_ascii_digit()) {
+        return;
+    }
+    if let Some(c) = SCORE_LINE.captures(&remainder) {
         if let (Ok(s1), Ok(s2)) = (
             c.get(1).unwrap().as_str().parse::<i32>(),
             c.get(2).unwrap().as_str().parse::<i32>(),
@@ -162,4 +187,34 @@ Civ draft: https://aoe2cm.net/draft/vlrcX
             Some("https://aoe2cm.net/draft/ab12cd34")
         );
     }
+
+    #[test]
+    fn civ_draft_url_containing_map_keyword_stays_whole() {
+        let entry = parsed(
+            "<@1> vs <@2>\nCivs: https://aoe2cm.net/draft/maps1\nMap: https://aoe2cm.net/draft/x\n",
+        );
+        assert_eq!(
+            entry.civ_draft.as_deref(),
+            Some("https://aoe2cm.net/draft/maps1")
+        );
+        assert_eq!(
+            entry.map_draft.as_deref(),
+            Some("https://aoe2cm.net/draft/x")
+        );
+    }
+
+    #[test]
+    fn hostile_input_parses_without_backtracking_blowup() {
+        // Shapes that make a backtracking engine go exponential/quadratic on
+        // SCORE_LINE and TOKENS. The regex crate guarantees linear time; this
+        // guards against swapping in an engine that doesn't.
+        let mut content = "1".to_string();
+        content.push_str(&" -".repeat(50_000));
+        content.push('\n');
+        content.push_str(&"map ".repeat(20_000));
+        content.push_str(&"<@".repeat(20_000));
+        let entry = parsed(&content);
+        assert_eq!(entry.player1_score, None);
+        assert_eq!(entry.player1_id, None);
+    }
 }
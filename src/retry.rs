@@ -5,7 +5,7 @@
 //! single [`backoff`] policy below, the matching `*_retryable` predicate so we
 //! only retry transient errors, and [`log_retry`] so each attempt is visible.
 //!
-//! `append_row` (Sheets values.append) is deliberately retried even though it
+//! `append_rows` (Sheets values.append) is deliberately retried even though it
 //! is not idempotent: a 503 returned to the client may still have committed
 //! the row, so a retry can rarely create a duplicate. A duplicate row is
 //! visible and hand-deletable; silently losing a result is worse.
@@ -1,3 +1,13 @@
+use std::{
+    future::Future,
+    path::PathBuf,
+    sync::{
+        atomic::{AtomicUsize, Ordering},
+        Arc,
+    },
+    time::Duration,
+};
+
 use anyhow::{anyhow, Context, Result};
 use backon::Retryable;
 use google_sheets4::{
@@ -7,37 +17,52 @@ use google_sheets4::{
     },
     hyper_rustls, hyper_util,
     yup_oauth2::{
-        authenticator::ApplicationDefaultCredentialsTypes,
+        authenticator::ApplicationDefaultCredentialsTypes, read_service_account_key,
         ApplicationDefaultCredentialsAuthenticator, ApplicationDefaultCredentialsFlowOpts,
+        ServiceAccountAuthenticator,
     },
 };
 use hyper_rustls::HttpsConnector;
 use hyper_util::client::legacy::connect::HttpConnector;
-use tracing::info;
+use tokio::{
+    sync::{
+        mpsc::{self, UnboundedReceiver, UnboundedSender},
+        oneshot,
+    },
+    task::JoinHandle,
+    time::{timeout_at, Instant},
+};
+use tracing::{error, info};
 
 use crate::retry;
 
 type Hub = Sheets<HttpsConnector<HttpConnector>>;
 
-pub struct SheetsClient {
+/// How long the flusher keeps collecting after the first queued row before it
+/// writes. Bounds the added latency for a lone result.
+const BATCH_LINGER: Duration = Duration::from_secs(2);
+/// Upper bound on rows coalesced into one flush (across all tabs).
+const BATCH_MAX_ROWS: usize = 50;
+
+/// A hub plus a human-readable name for it (the key file, or ADC) for
+/// error context.
+struct Identity {
+    name: String,
     hub: Hub,
+}
+
+pub struct SheetsClient {
+    /// One hub per write identity. Append attempts (retries included) rotate
+    /// through all of them so each identity's per-user write quota adds up.
+    hubs: Vec<Identity>,
+    next_write: AtomicUsize,
     sheet_id: String,
 }
 
 impl SheetsClient {
-    pub async fn new(sheet_id: String) -> Result<Self> {
-        let opts = ApplicationDefaultCredentialsFlowOpts::default();
-        let auth = match ApplicationDefaultCredentialsAuthenticator::builder(opts).await {
-            ApplicationDefaultCredentialsTypes::InstanceMetadata(builder) => builder
-                .build()
-                .await
-                .context("building GCE-metadata authenticator")?,
-            ApplicationDefaultCredentialsTypes::ServiceAccount(builder) => builder
-                .build()
-                .await
-                .context("building service-account authenticator")?,
-        };
-
+    /// With no `key_files`, authenticates as the runtime's ADC identity.
+    /// Otherwise builds one hub per service-account key file.
+    pub async fn new(sheet_id: String, key_files: &[PathBuf]) -> Result<Self> {
         let connector = hyper_rustls::HttpsConnectorBuilder::new()
             .with_native_roots()
             .context("loading native TLS roots")?
@@ -49,17 +74,96 @@ impl SheetsClient {
             hyper_util::client::legacy::Client::builder(hyper_util::rt::TokioExecutor::new())
                 .build(connector);
 
-        let hub = Sheets::new(client, auth);
-        Ok(Self { hub, sheet_id })
+        let mut hubs = Vec::with_capacity(key_files.len().max(1));
+        if key_files.is_empty() {
+            let opts = ApplicationDefaultCredentialsFlowOpts::default();
+            let auth = match ApplicationDefaultCredentialsAuthenticator::builder(opts).await {
+                ApplicationDefaultCredentialsTypes::InstanceMetadata(builder) => builder
+                    .build()
+                    .await
+                    .context("building GCE-metadata authenticator")?,
+                ApplicationDefaultCredentialsTypes::ServiceAccount(builder) => builder
+                    .build()
+                    .await
+                    .context("building service-account authenticator")?,
+            };
+            hubs.push(Identity {
+                name: "application default credentials".into(),
+                hub: Sheets::new(client, auth),
+            });
+        } else {
+            for path in key_files {
+                let key = read_service_account_key(path)
+                    .await
+                    .with_context(|| format!("reading service-account key {}", path.display()))?;
+                let auth = ServiceAccountAuthenticator::builder(key)
+                    .build()
+                    .await
+                    .with_context(|| {
+                        format!(
+                            "building service-account authenticator from {}",
+                            path.display()
+                        )
+                    })?;
+                hubs.push(Identity {
+                    name: path.display().to_string(),
+                    hub: Sheets::new(client.clone(), auth),
+                });
+            }
+            info!(
+                "Sheets writes rotate across {} service account(s)",
+                hubs.len()
+            );
+        }
+
+        Ok(Self {
+            hubs,
+            next_write: AtomicUsize::new(0),
+            sheet_id,
+        })
+    }
+
+    /// Hub for the startup-only metadata calls (`list_tabs`, `ensure_tabs`).
+    fn primary_hub(&self) -> &Hub {
+        &self.hubs[0].hub
+    }
+
+    fn write_hub(&self) -> &Hub {
+        let idx = self.next_write.fetch_add(1, Ordering::Relaxed) % self.hubs.len();
+        &self.hubs[idx].hub
+    }
+
+    /// Fetches the spreadsheet once as every write identity, so a key whose
+    /// token can't be minted, or whose account the sheet isn't shared with,
+    /// fails startup instead of losing every Nth flush to a permanent error.
+    /// A read can't prove Editor access: a Viewer-only share still passes.
+    pub async fn verify_write_identities(&self) -> Result<()> {
+        for identity in &self.hubs {
+            (|| async { identity.hub.spreadsheets().get(&self.sheet_id).doit().await })
+                .retry(retry::backoff())
+                .when(retry::sheets_retryable)
+                .notify(retry::log_retry("sheets.spreadsheets.get"))
+                .await
+                .with_context(|| {
+                    format!("opening spreadsheet {} as {}", self.sheet_id, identity.name)
+                })?;
+        }
+        Ok(())
     }
 
     pub async fn list_tabs(&self) -> Result<Vec<String>> {
-        let (_, sheet) = (|| async { self.hub.spreadsheets().get(&self.sheet_id).doit().await })
-            .retry(retry::backoff())
-            .when(retry::sheets_retryable)
-            .notify(retry::log_retry("sheets.spreadsheets.get"))
-            .await
-            .with_context(|| format!("fetching spreadsheet metadata for {}", self.sheet_id))?;
+        let (_, sheet) = (|| async {
+            self.primary_hub()
+                .spreadsheets()
+                .get(&self.sheet_id)
+                .doit()
+                .await
+        })
+        .retry(retry::backoff())
+        .when(retry::sheets_retryable)
+        .notify(retry::log_retry("sheets.spreadsheets.get"))
+        .await
+        .with_context(|| format!("fetching spreadsheet metadata for {}", self.sheet_id))?;
         let title = sheet
             .properties
             .as_ref()
@@ -107,7 +211,7 @@ impl SheetsClient {
                 requests: Some(requests),
                 ..Default::default()
             };
-            self.hub
+            self.primary_hub()
                 .spreadsheets()
                 .batch_update(body, &self.sheet_id)
                 .doit()
@@ -121,23 +225,31 @@ impl SheetsClient {
         Ok(())
     }
 
-    pub async fn append_row(&self, tab: &str, row: Vec<String>) -> Result<()> {
-        let values: Vec<serde_json::Value> =
-            row.into_iter().map(serde_json::Value::String).collect();
+    pub async fn append_rows(&self, tab: &str, rows: Vec<Vec<String>>) -> Result<()> {
+        let values: Vec<Vec<serde_json::Value>> = rows
+            .into_iter()
+            .map(|row| row.into_iter().map(serde_json::Value::String).collect())
+            .collect();
         let range = format!("{tab}!A1");
         // `values_append` consumes the `ValueRange`, so it is rebuilt per
-        // attempt by cloning the row payload. Note: values.append is not
+        // attempt by cloning the rows payload. Note: values.append is not
         // idempotent — a retry after a lost 503 response can duplicate the
-        // row; accepted (rare, visible) over silently losing a result.
+        // rows; accepted (rare, visible) over silently losing a result.
+        // Each attempt takes the next identity, so a 429 retries against a
+        // different account's quota rather than the exhausted one.
         let (_, response) = (|| async {
             let req = ValueRange {
-                values: Some(vec![values.clone()]),
+                values: Some(values.clone()),
                 ..Default::default()
             };
-            self.hub
+            self.write_hub()
                 .spreadsheets()
                 .values_append(req, &self.sheet_id, &range)
                 .value_input_option("RAW")
+                .insert_data_option("INSERT_ROWS")
+                // Only `updates.updated_rows` is read back; don't have Sheets
+                // echo the written values.
+                .include_values_in_response(false)
                 .doit()
                 .await
         })
@@ -145,7 +257,7 @@ impl SheetsClient {
         .when(retry::sheets_retryable)
         .notify(retry::log_retry("sheets.values_append"))
         .await
-        .with_context(|| format!("appending row to sheet tab '{tab}'"))?;
+        .with_context(|| format!("appending {} row(s) to sheet tab '{tab}'", values.len()))?;
         let updated_rows = response
             .updates
             .as_ref()
@@ -158,3 +270,298 @@ impl SheetsClient {
         Ok(())
     }
 }
+
+/// Handle for queueing result rows onto the background flusher, which
+/// coalesces them into one `values.append` per tab instead of one call per
+/// message. Keeps bursts of results well under the per-user write quota.
+#[derive(Clone)]
+pub struct RowQueue {
+    tx: UnboundedSender<QueuedRow>,
+}
+
+struct QueuedRow {
+    tab: String,
+    message_id: u64,
+    row: Vec<String>,
+}
+
+impl RowQueue {
+    /// Spawns the flusher task. It finishes (after writing anything still
+    /// queued) once every `RowQueue` clone has been dropped; see
+    /// [`RowFlusher::shutdown`] for bounding that on exit.
+    pub fn spawn(sheets: Arc<SheetsClient>) -> (Self, RowFlusher) {
+        Self::spawn_with(move |batch: TabBatch| {
+            let sheets = sheets.clone();
+            async move {
+                if let Err(e) = sheets.append_rows(&batch.tab, batch.rows).await {
+                    error!(
+                        "appending row(s) failed for message(s) {:?}: {e:#}",
+                        batch.message_ids
+                    );
+                }
+            }
+        })
+    }
+
+    fn spawn_with<W, F>(write: W) -> (Self, RowFlusher)
+    where
+        W: FnMut(TabBatch) -> F + Send + 'static,
+        F: Future<Output = ()> + Send + 'static,
+    {
+        let (tx, rx) = mpsc::unbounded_channel();
+        let (stop, stop_rx) = oneshot::channel();
+        let task = tokio::spawn(flush_rows(write, rx, stop_rx));
+        (Self { tx }, RowFlusher { stop, task })
+    }
+
+    pub fn push(&self, tab: &str, message_id: u64, row: Vec<String>) -> Result<()> {
+        self.tx
+            .send(QueuedRow {
+                tab: tab.to_string(),
+                message_id,
+                row,
+            })
+            .map_err(|_| anyhow!("sheet row queue is closed"))
+    }
+}
+
+/// Owner of the flusher task, used to drain the queue on shutdown.
+pub struct RowFlusher {
+    stop: oneshot::Sender<()>,
+    task: JoinHandle<()>,
+}
+
+impl RowFlusher {
+    /// Stops the linger, so every row still queued or pushed from now on is
+    /// written straight away, and waits until `deadline` for the flusher to
+    /// finish. It finishes once the last `RowQueue` clone is dropped, so
+    /// handlers still running at shutdown can push their rows; anything
+    /// left after `deadline` is lost.
+    pub async fn shutdown(self, deadline: Instant) {
+        let _ = self.stop.send(());
+        if timeout_at(deadline, self.task).await.is_err() {
+            error!("sheet row flusher still running at the shutdown deadline; later rows are lost");
+        }
+    }
+}
+
+async fn flush_rows<W, F>(
+    mut write: W,
+    mut rx: UnboundedReceiver<QueuedRow>,
+    mut stop: oneshot::Receiver<()>,
+) where
+    W: FnMut(TabBatch) -> F,
+    F: Future<Output = ()>,
+{
+    // Set once `RowFlusher::shutdown` is called (not when the `RowFlusher`
+    // is merely dropped); from then on batches don't linger.
+    let mut stopping = false;
+    let mut stop_pending = true;
+    loop {
+        let first = tokio::select! {
+            row = rx.recv() => row,
+            stopped = &mut stop, if stop_pending => {
+                stop_pending = false;
+                stopping = stopped.is_ok();
+                continue;
+            }
+        };
+        let Some(first) = first else {
+            break;
+        };
+        let mut deadline = Instant::now();
+        if !stopping {
+            deadline += BATCH_LINGER;
+        }
+        let mut batch = vec![first];
+        while batch.len() < BATCH_MAX_ROWS {
+            tokio::select! {
+                // Rows already buffered are still taken once `deadline` has
+                // passed: `timeout_at` polls `recv` before the timer.
+                row = timeout_at(deadline, rx.recv()) => match row {
+                    Ok(Some(row)) => batch.push(row),
+                    // Linger expired, or the queue closed: write what we have.
+                    Ok(None) | Err(_) => break,
+                },
+                stopped = &mut stop, if stop_pending => {
+                    stop_pending = false;
+                    stopping = stopped.is_ok();
+                    if stopping {
+                        deadline = Instant::now();
+                    }
+                }
+            }
+        }
+        for tab_batch in group_by_tab(batch) {
+            write(tab_batch).await;
+        }
+    }
+}
+
+#[derive(Debug, PartialEq, Eq)]
+struct TabBatch {
+    tab: String,
+    message_ids: Vec<u64>,
+    rows: Vec<Vec<String>>,
+}
+
+/// Groups queued rows by tab, keeping tabs in first-seen order and rows in
+/// arrival order within each tab.
+fn group_by_tab(batch: Vec<QueuedRow>) -> Vec<TabBatch> {
+    let mut grouped: Vec<TabBatch> = Vec::new();
+    for queued in batch {
+        let idx = match grouped.iter().position(|b| b.tab == queued.tab) {
+            Some(idx) => idx,
+            None => {
+                grouped.push(TabBatch {
+                    tab: queued.tab,
+                    message_ids: Vec::new(),
+                    rows: Vec::new(),
+                });
+                grouped.len() - 1
+            }
+        };
+        grouped[idx].message_ids.push(queued.message_id);
+        grouped[idx].rows.push(queued.row);
+    }
+    grouped
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::sync::Mutex;
+
+    /// `(tab, message_ids)` of every batch the flusher wrote.
+    type Written = Arc<Mutex<Vec<(String, Vec<u64>)>>>;
+
+    /// Flusher whose writes are recorded instead of hitting Sheets.
+    fn recording_queue() -> (RowQueue, RowFlusher, Written) {
+        let written = Arc::new(Mutex::new(Vec::new()));
+        let sink = written.clone();
+        let (queue, flusher) = RowQueue::spawn_with(move |batch: TabBatch| {
+            sink.lock().unwrap().push((batch.tab, batch.message_ids));
+            async {}
+        });
+        (queue, flusher, written)
+    }
+
+    fn push(queue: &RowQueue, tab: &str, message_id: u64) {
+        queue
+            .push(tab, message_id, vec![message_id.to_string()])
+            .unwrap();
+    }
+
+    #[tokio::test(start_paused = true)]
+    async fn flush_waits_out_linger_and_coalesces() {
+        let (queue, _flusher, written) = recording_queue();
+        push(&queue, "A", 1);
+        tokio::time::sleep(BATCH_LINGER / 2).await;
+        assert!(written.lock().unwrap().is_empty());
+        push(&queue, "B", 2);
+        push(&queue, "A", 3);
+        tokio::time::sleep(BATCH_LINGER).await;
+        assert_eq!(
+            *written.lock().unwrap(),
+            vec![("A".to_string(), vec![1, 3]), ("B".to_string(), vec![2])]
+        );
+    }
+
+    #[tokio::test(start_paused = true)]
+    async fn flush_splits_at_max_rows_without_lingering() {
+        let (queue, _flusher, written) = recording_queue();
+        let total = BATCH_MAX_ROWS as u64 * 2 + 5;
+        for id in 0..total {
+            push(&queue, "A", id);
+        }
+        // Full batches go out immediately; only the remainder lingers.
+        tokio::time::sleep(BATCH_LINGER / 2).await;
+        let sizes: Vec<usize> = written
+            .lock()
+            .unwrap()
+            .iter()
+            .map(|(_, ids)| ids.len())
+            .collect();
+        assert_eq!(sizes, vec![BATCH_MAX_ROWS, BATCH_MAX_ROWS]);
+        tokio::time::sleep(BATCH_LINGER).await;
+        assert_eq!(written.lock().unwrap().len(), 3);
+        assert_eq!(
+            written.lock().unwrap()[2].1,
+            (BATCH_MAX_ROWS as u64 * 2..total).collect::<Vec<_>>()
+        );
+    }
+
+    #[tokio::test(start_paused = true)]
+    async fn shutdown_skips_linger_and_takes_late_pushes() {
+        let (queue, flusher, written) = recording_queue();
+        push(&queue, "A", 1);
+        // A handler still finishing when shutdown starts.
+        let late = tokio::spawn(async move {
+            tokio::time::sleep(BATCH_LINGER / 4).await;
+            push(&queue, "A", 2);
+        });
+        let start = Instant::now();
+        flusher.shutdown(start + Duration::from_secs(60)).await;
+        assert!(start.elapsed() < BATCH_LINGER);
+        assert_eq!(
+            *written.lock().unwrap(),
+            vec![("A".to_string(), vec![1]), ("A".to_string(), vec![2])]
+        );
+        late.await.unwrap();
+    }
+
+    #[tokio::test(start_paused = true)]
+    async fn shutdown_gives_up_at_deadline() {
+        let (_queue, flusher, _written) = recording_queue();
+        let deadline = Instant::now() + BATCH_LINGER;
+        flusher.shutdown(deadline).await;
+        assert!(Instant::now() >= deadline);
+    }
+
+    #[tokio::test]
+    async fn new_rejects_unreadable_key_file() {
+        // As in `main`; building the TLS connector needs a provider pinned.
+        let _ = rustls::crypto::ring::default_provider().install_default();
+        let path = PathBuf::from("/nonexistent/sheets-writer.json");
+        let Err(e) = SheetsClient::new("sheet".into(), &[path]).await else {
+            panic!("built a client from a missing key file");
+        };
+        assert!(
+            format!("{e:#}").contains("/nonexistent/sheets-writer.json"),
+            "{e:#}"
+        );
+    }
+
+    fn queued(tab: &str, message_id: u64) -> QueuedRow {
+        QueuedRow {
+            tab: tab.into(),
+            message_id,
+            row: vec![message_id.to_string()],
+        }
+    }
+
+    #[test]
+    fn group_by_tab_keeps_first_seen_tab_order_and_row_order() {
+        let grouped = group_by_tab(vec![
+            queued("B", 1),
+            queued("A", 2),
+            queued("B", 3),
+            queued("A", 4),
+        ]);
+        assert_eq!(
+            grouped,
+            vec![
+                TabBatch {
+                    tab: "B".into(),
+                    message_ids: vec![1, 3],
+                    rows: vec![vec!["1".into()], vec!["3".into()]],
+                },
+                TabBatch {
+                    tab: "A".into(),
+                    message_ids: vec![2, 4],
+                    rows: vec![vec!["2".into()], vec!["4".into()]],
+                },
+            ]
+        );
+    }
+}